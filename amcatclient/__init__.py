@@ -1,2 +1,2 @@
 from __future__ import unicode_literals, print_function, absolute_import
-from .amcatclient import AmcatAPI, APIError
+from .amcatclient import AmcatAPI, APIError, HashCache, Cancelled, DeadlineExceeded, RequestTracer
@@ -38,6 +38,11 @@ import os.path
 import csv
 import itertools
 import tempfile
+import hashlib
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from six import string_types
 
@@ -45,6 +50,10 @@ log = logging.getLogger(__name__)
 
 Version = namedtuple("Version", ["major", "minor", "build"])
 
+# What the server supports, derived once per connection from its version:
+# - scroll: articles can be fetched by scrolling the (project) meta endpoint (>= 3.4)
+Capabilities = namedtuple("Capabilities", ["version", "scroll"])
+
 def serialize(obj):
     """JSON serializer that accepts datetime & date"""
     from datetime import datetime, date, time
@@ -69,6 +78,51 @@ class URL:
     status = 'status'
 
 AUTH_FILE = os.path.join("~", ".amcatauth")
+# default (connect, read) timeout in seconds for requests to the server
+DEFAULT_TIMEOUT = (10, 300)
+TOKEN_CACHE = os.path.join("~", ".amcattokens")
+
+_AUTH_FILE_CACHE = {}
+
+def _read_auth_file(fn):
+    """
+    Parse the ~/.amcatauth csv file, caching the result until the file changes
+    """
+    mtime = os.path.getmtime(fn)
+    cached = _AUTH_FILE_CACHE.get(fn)
+    if cached is None or cached[0] != mtime:
+        with open(fn) as f:
+            cached = (mtime, list(csv.reader(f)))
+        _AUTH_FILE_CACHE[fn] = cached
+    return cached[1]
+
+def _load_token_cache():
+    """
+    Read the token cache, which maps 'host|user' to a dict with token and version.
+    The cache is ignored if it is readable by anyone but the current user.
+    """
+    fn = os.path.expanduser(TOKEN_CACHE)
+    try:
+        if os.stat(fn).st_mode & 0o077:
+            log.warning("Ignoring token cache {fn}: file should only be accessible by its owner".format(**locals()))
+            return {}
+        with open(fn) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def _save_token_cache(cache):
+    """Atomically write the token cache, readable only by the current user"""
+    fn = os.path.expanduser(TOKEN_CACHE)
+    # mkstemp creates a uniquely named file with mode 0600
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fn), prefix=".amcattokens.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp, fn)
+    except:
+        os.remove(tmp)
+        raise
 
 class APIError(EnvironmentError):
 
@@ -88,6 +142,14 @@ class APIError(EnvironmentError):
 class Unauthorized(APIError):
     pass
 
+class Cancelled(Exception):
+    """Raised when an operation is stopped because its cancel event was set"""
+    pass
+
+class DeadlineExceeded(Cancelled):
+    """Raised when an operation did not finish before its deadline"""
+    pass
+
 def _APIError(http_status, *args, **kargs):
     cls = Unauthorized if http_status == 401 else APIError
     return cls(http_status, *args, **kargs)
@@ -137,7 +199,8 @@ def check(response, expected_status=200, url=None):
 
 class AmcatAPI(object):
 
-    def __init__(self, host, user=None, password=None, token=None):
+    def __init__(self, host, user=None, password=None, token=None, lazy=False, cache_token=False,
+                 timeout=DEFAULT_TIMEOUT, tracer=None, transport=None):
         """
         Connection to an AmCAT server.
 
@@ -145,18 +208,116 @@ class AmcatAPI(object):
         :param user: Username. If not given, taken from AMCAT_USER or USER environment
         :param password: Password. If not given, taken from AMCAT_PASSWORD environment, or read from ~/.amcatauth
         :param token: Token to use (requires amcat >= 3.5)
+        :param lazy: If True, postpone authentication until the first request
+        :param cache_token: If True, reuse (and store) the token and server version in ~/.amcattokens,
+                            so connecting does not require a round trip to the server
+        :param timeout: Default timeout for requests, in seconds or as a (connect, read) tuple
+        :param tracer: Optional RequestTracer to record (a sample of) the requests made
+        :param transport: Function to make the HTTP requests with, taking the same arguments as
+                          requests.request (default). See amcatclient.cassette for recording and
+                          replaying requests
         """
         self.host = host
-        if token:
+        self.timeout = timeout
+        self.tracer = tracer
+        self.transport = transport or requests.request
+        self.cache_token = cache_token
+        self._user = user
+        self._password = password
+        self._initial_token = token
+        self._token = None
+        self._version = None
+        self._token_from_cache = False
+        self._capabilities = None
+        # (re-)authentication can be triggered by multiple threads using this connection
+        self._auth_lock = threading.RLock()
+        if cache_token and not token:
+            cached = _load_token_cache().get(self._cache_key())
+            if cached:
+                self._token, self._version = cached['token'], cached['version']
+                self._token_from_cache = True
+                log.debug("Using cached token for {self.host}".format(**locals()))
+        if not lazy:
+            self.authenticate()
+            logging.info("Connected to {self.host} (AmCAT version {self.version})".format(**locals()))
+
+    @property
+    def token(self):
+        if self._token is None:
+            self.authenticate()
+        return self._token
+
+    @token.setter
+    def token(self, token):
+        self._token = token
+
+    @property
+    def version(self):
+        if self._version is None:
+            self.authenticate()
+        return self._version
+
+    @version.setter
+    def version(self, version):
+        self._version = version
+
+    def authenticate(self):
+        """
+        Get a token for this connection (unless it already has one), by renewing
+        the token given to the constructor or by logging in with user and password
+        """
+        with self._auth_lock:
+            if self._token is not None and self._version is not None:
+                return
+            token = self._initial_token
+            if token:
+                try:
+                    self._token, self._version = self.renew_token(token)
+                except APIError as e:
+                    logging.warning("Cannot renew token (requires amcat>3.5), trying normal authentication: {e}"
+                                    .format(**locals()))
+                    token = None
+            if not token:
+                self._token, self._version = self.get_token(self._user, self._password)
+            self._token_from_cache = False
+            if self.cache_token:
+                cache = _load_token_cache()
+                cache[self._cache_key()] = {'token': self._token, 'version': self._version}
+                _save_token_cache(cache)
+
+    def _cache_key(self):
+        user = self._user
+        if user is None:
             try:
-                self.token, self.version = self.renew_token(token)
-            except APIError as e:
-                logging.warning("Cannot renew token (requires amcat>3.5), trying normal authentication: {e}"
-                                .format(**locals()))
-                token = None
-        if token is None:
-            self.token, self.version = self.get_token(user, password)
-        logging.info("Connected to {self.host} (AmCAT version {self.version})".format(**locals()))
+                user, _ = self._get_auth()
+            except Exception:
+                user = os.environ.get("AMCAT_USER", os.environ.get("USER"))
+        return "{self.host}|{user}".format(**locals())
+
+    def _forget_token(self):
+        """Drop the current token, and remove it from the token cache"""
+        self._token = self._version = None
+        self._token_from_cache = False
+        if self.cache_token:
+            cache = _load_token_cache()
+            if cache.pop(self._cache_key(), None):
+                _save_token_cache(cache)
+
+    @property
+    def capabilities(self):
+        """
+        The Capabilities of the server, parsed from its version string.
+        This is computed once, and again only if the version changes (i.e. after re-authenticating)
+        """
+        version = self.version
+        if self._capabilities is None or self._capabilities[0] != version:
+            m = re.match(r"(\d+)\.(\d+)(.*)", version)
+            if not m:
+                raise Exception("Cannot parse version string: {version}".format(**locals()))
+            v = Version(int(m.group(1)), int(m.group(2)), m.group(3))
+            caps = Capabilities(version=v, scroll=(v.major, v.minor) >= (3, 4))
+            self._capabilities = (version, caps)
+        return self._capabilities[1]
 
     def has_version(self, major=3, minor=None):
         v = self.get_version()
@@ -165,10 +326,7 @@ class AmcatAPI(object):
         return (minor is None) or (v.minor >= minor)
 
     def get_version(self):
-        m = re.match(r"(\d+)\.(\d+)(.*)", self.version)
-        if not m:
-            raise Exception("Cannot parse version string: {self.version}".format(**locals()))
-        return Version(int(m.group(1)), int(m.group(2)), m.group(3))
+        return self.capabilities.version
 
     def _get_auth(self, user=None, password=None):
         """
@@ -179,7 +337,7 @@ class AmcatAPI(object):
         """
         fn = os.path.expanduser(AUTH_FILE)
         if os.path.exists(fn):
-            for i, line in enumerate(csv.reader(open(fn))):
+            for i, line in enumerate(_read_auth_file(fn)):
                 if len(line) != 3:
                     log.warning("Cannot parse line {i} in {fn}".format(**locals()))
                     continue
@@ -198,7 +356,7 @@ class AmcatAPI(object):
         return user, password
 
     def renew_token(self, token):
-        self.token = token
+        self._token = token
         resp = self.request(URL.get_token, method='post', expected_status=200)
         return resp['token'], resp['version']
 
@@ -206,7 +364,7 @@ class AmcatAPI(object):
         if user is None or password is None:
             user, password = self._get_auth()
         url = "{self.host}/api/v4/{url}".format(url=URL.get_token, **locals())
-        r = requests.post(url, data={'username': user, 'password': password})
+        r = self.transport("post", url, data={'username': user, 'password': password}, timeout=self.timeout)
         try:
             r.raise_for_status()
         except:
@@ -216,12 +374,40 @@ class AmcatAPI(object):
         return r['token'], r.get('version', '3.3 (or older)')
 
     def request(self, url, method="get", format="json", data=None,
-                expected_status=None, headers=None, use_xpost=True, **options):
+                expected_status=None, headers=None, use_xpost=True,
+                timeout=None, deadline=None, cancel=None, **options):
         """
         Make an HTTP request to the given relative URL with the host,
         user, and password information. Returns the deserialized json
-        if successful, and raises an exception otherwise
+        if successful, and raises an exception otherwise.
+        If a cached token is rejected, authenticate again and retry once.
+        :param timeout: Timeout for this request, overriding self.timeout
+        :param deadline: Time (as in time.time()) before which the request should finish.
+                         Raises DeadlineExceeded if it has passed, and shortens the timeout
+                         otherwise (note that the read timeout applies per read, not in total)
+        :param cancel: An Event (e.g. threading.Event); Cancelled is raised if it is set
         """
+        timeout = _limit_timeout(url, timeout or self.timeout, deadline, cancel)
+        token, from_cache = self._token, self._token_from_cache
+        try:
+            return self._request(url, method, format, data, expected_status, headers, use_xpost,
+                                 timeout, deadline, **options)
+        except Unauthorized:
+            if not from_cache:
+                raise
+            with self._auth_lock:
+                # another thread may already have replaced the rejected token
+                if self._token == token:
+                    log.warning("Cached token for {self.host} was rejected, authenticating again"
+                                .format(**locals()))
+                    self._forget_token()
+                self.authenticate()
+            timeout = _limit_timeout(url, timeout, deadline, cancel)
+            return self._request(url, method, format, data, expected_status, headers, use_xpost,
+                                 timeout, deadline, **options)
+
+    def _request(self, url, method, format, data, expected_status, headers, use_xpost, timeout, deadline,
+                 **options):
         if expected_status is None:
             if method == "get":
                 expected_status = 200
@@ -249,31 +435,43 @@ class AmcatAPI(object):
             options = None
             method = "post"
 
-        r = requests.request(method, url, data=data, params=options, headers=headers)
-
-        log.debug(
-            "HTTP {method} {url} (options={options!r}, data={data!r},"
-            "headers={headers}) -> {r.status_code}".format(**locals())
-        )
+        start = time.time()
+        try:
+            r = self.transport(method, url, data=data, params=options, headers=headers, timeout=timeout)
+        except requests.Timeout as e:
+            if deadline is not None and time.time() >= deadline:
+                raise DeadlineExceeded("Deadline passed during request to {url}: {e}".format(**locals()))
+            raise
+        duration = time.time() - start
+
+        # note: headers are not logged, as they contain the auth token
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("HTTP %s %s (options=%s, data=%s) -> %s in %.3fs", method, url,
+                      summarize(options), summarize(data), r.status_code, duration)
+        if self.tracer is not None:
+            self.tracer.record(method, url, r, duration, data)
         return check(r, expected_status=expected_status)
 
 
 
-    def get_pages(self, url, page=1, page_size=100, yield_pages=False, **filters):
+    def get_pages(self, url, page=1, page_size=100, yield_pages=False,
+                  timeout=None, deadline=None, cancel=None, **filters):
         """
         Get all pages at url, yielding individual results
         :param url: the url to fetch
         :param page: start from this page
         :param page_size: results per page
         :param yield_pages: yield whole pages rather than individual results
+        :param timeout, deadline, cancel: see request; the deadline applies to all pages together
         :param filters: additional filters
         :return: a generator of objects (dicts) from the API
         """
         n = 0
         for page in itertools.count(page):
-            r = self.request(url, page=page, page_size=page_size, **filters)
+            r = self.request(url, page=page, page_size=page_size,
+                             timeout=timeout, deadline=deadline, cancel=cancel, **filters)
             n += len(r['results'])
-            log.debug("Got {url} page {page} / {pages}".format(url=url, **r))
+            log.debug("Got %s page %s / %s", url, r.get('page'), r.get('pages'))
             if yield_pages:
                 yield r
             else:
@@ -282,12 +480,14 @@ class AmcatAPI(object):
             if r['next'] is None:
                 break
 
-    def get_scroll(self, url, page_size=100, yield_pages=False, **filters):
+    def get_scroll(self, url, page_size=100, yield_pages=False,
+                   timeout=None, deadline=None, cancel=None, **filters):
         """
         Scroll through the resource at url and yield the individual results
         :param url: url to scroll through
         :param page_size: results per page
         :param yield_pages: yield whole pages rather than individual results
+        :param timeout, deadline, cancel: see request; the deadline applies to all pages together
         :param filters: Additional filters
         :return: a generator of objects (dicts) from the API
         """
@@ -295,9 +495,9 @@ class AmcatAPI(object):
         options = dict(page_size=page_size, **filters)
         format = filters.get('format')
         while True:
-            r = self.request(url, use_xpost=False, **options)
+            r = self.request(url, use_xpost=False, timeout=timeout, deadline=deadline, cancel=cancel, **options)
             n += len(r['results'])
-            log.debug("Got {} {n}/{total}".format(url.split("?")[0], total=r['total'], **locals()))
+            log.debug("Got %s %s/%s", url.split("?")[0], n, r['total'])
             if yield_pages:
                 yield r
             else:
@@ -354,7 +554,49 @@ class AmcatAPI(object):
             return self.request(
                 url, method='post', data=json_data, headers=headers)
 
-    def create_articles(self, project, articleset, json_data=None, batch_size=100, **options):
+    def create_sets(self, project, sets, threads=8):
+        """
+        Create many article sets concurrently
+        :param sets: a list of dicts with the arguments for each set (e.g. name and provenance)
+        :param threads: the number of sets to create at the same time
+        :return: a list of the created sets, in the same order
+        """
+        with ThreadPoolExecutor(threads) as pool:
+            return list(pool.map(lambda s: self.create_set(project, s), sets))
+
+    def add_to_set(self, project, articleset, article_ids, batch_size=1000, threads=1,
+                   deadline=None, cancel=None):
+        """
+        Add existing articles to a set by id (without uploading the articles again)
+        :param article_ids: an iterable of article ids
+        :param batch_size: number of ids per request
+        :param threads: number of requests to send at the same time
+        :param deadline, cancel: see request
+        """
+        url = URL.article.format(**locals())
+        self._bulk_ids(url, "post", 201, article_ids, batch_size, threads, deadline, cancel)
+
+    def remove_from_set(self, project, articleset, article_ids, batch_size=1000, threads=1,
+                        deadline=None, cancel=None):
+        """
+        Remove articles from a set by id (the articles themselves are not deleted)
+        Parameters are as for add_to_set
+        """
+        url = URL.article.format(**locals())
+        self._bulk_ids(url, "delete", 204, article_ids, batch_size, threads, deadline, cancel)
+
+    def _bulk_ids(self, url, method, expected_status, article_ids, batch_size, threads, deadline, cancel):
+        headers = {'content-type': 'application/json'}
+        def send(ids):
+            logging.info("{} {} article ids {}".format(method.upper(), len(ids), url))
+            return self.request(url, method=method, data=json.dumps(ids), headers=headers,
+                                expected_status=expected_status, deadline=deadline, cancel=cancel)
+        with ThreadPoolExecutor(threads) as pool:
+            for _ in pool.map(send, get_chunks(article_ids, batch_size)):
+                pass
+
+    def create_articles(self, project, articleset, json_data=None, batch_size=100, hash_cache=None,
+                        timeout=None, deadline=None, cancel=None, **options):
         """
         Create one or more articles in the set. Provide the needed arguments
         using the json_data or with key-value pairs.
@@ -363,39 +605,68 @@ class AmcatAPI(object):
                           can contain a 'children' attribute which
                           is another list of dictionaries.
         @param batch_size: Upload batch size. Set to None to disable batching
+        @param hash_cache: A HashCache of articles already in the set. If given, articles
+                           in json_data (a list) whose hash is in the cache are not uploaded,
+                           and the hashes of uploaded articles are added to the cache.
+                           Raises a ValueError if the cache belongs to another set
+        @param timeout, deadline, cancel: see request; the deadline applies to all batches together
         """
+        limits = dict(timeout=timeout, deadline=deadline, cancel=cancel)
+        if hash_cache is not None:
+            hash_cache.bind(self.host, project, articleset)
+        if hash_cache is not None and isinstance(json_data, list):
+            n = len(json_data)
+            json_data = hash_cache.new_articles(json_data)
+            if len(json_data) < n:
+                logging.info("Skipping {} of {n} articles that are already in the set".format(n - len(json_data), **locals()))
         if isinstance(json_data, list) and batch_size:
             result = []
             for chunk in get_chunks(json_data, batch_size):
                 logging.info(f"Uploading {len(chunk)} articles to AmCAT")
-                result += self._create_articles(project, articleset, chunk, **options)
+                result += self._create_articles(project, articleset, chunk, limits, **options)
+                if hash_cache is not None:
+                    hash_cache.add(chunk)
             return result
         else: # don't chunk single article or json string
-            return self._create_articles(project, articleset, json_data, **options)
+            result = self._create_articles(project, articleset, json_data, limits, **options)
+            if hash_cache is not None and isinstance(json_data, list):
+                hash_cache.add(json_data)
+            return result
 
-    def _create_articles(self, project, articleset, json_data=None, **options):
+    def _create_articles(self, project, articleset, json_data=None, limits=None, **options):
         url = URL.article.format(**locals())
         # TODO duplicated from create_set, move into requests
         # (or separate post method?)
         if json_data is None:
             # form encoded request
-            return self.request(url, method="post", data=options)
+            return self.request(url, method="post", data=options, **(limits or {}))
         else:
             if not isinstance(json_data, string_types):
                 json_data = json.dumps(json_data, default=serialize)
             headers = {'content-type': 'application/json'}
-            return self.request(url, method='post', data=json_data, headers=headers)
+            return self.request(url, method='post', data=json_data, headers=headers, **(limits or {}))
 
     def get_articles(self, project, articleset=None, format='json', all_columns=False,
-                     columns=['date', 'headline', 'medium'], page_size=1000, page=1, **filters):
+                     columns=['date', 'headline', 'medium'], page_size=1000, page=1,
+                     timeout=None, deadline=None, cancel=None, **filters):
         if all_columns:
             columns = ["__ALL__"]
-        if self.has_version(3, 4):
+        limits = dict(timeout=timeout, deadline=deadline, cancel=cancel)
+        if self.capabilities.scroll:
             url = URL.projectmeta.format(**locals())
             return self.get_scroll(url, page=page, page_size=page_size, format=format, columns=",".join(columns),
-                                   filters=json.dumps(filters))
+                                   filters=json.dumps(filters), **limits)
         else:
-            return self.list_articles(project, articleset, page, page_size=page_size, **filters)
+            return self.list_articles(project, articleset, page, page_size=page_size, **dict(filters, **limits))
+
+    def save_articles(self, project, articleset, path, **kargs):
+        """
+        Download the articles in the set (see get_articles for the arguments)
+        into a local store at path, which allows fast repeated reading
+        :return: the amcatclient.store.ArticleStore, opened for reading
+        """
+        from amcatclient.store import write_store
+        return write_store(path, self.get_articles(project, articleset, **kargs))
 
     def get_articles_by_id(self, articles=None, format='json',
                      columns=['date', 'headline', 'medium'], page_size=100, **options):
@@ -420,6 +691,65 @@ class AmcatAPI(object):
         return self.get_pages(URL.search, q=query, col=columns, minimal=minimal, sets=articleset, **filters)
 
 
+def _limit_timeout(url, timeout, deadline=None, cancel=None):
+    """
+    Check whether a request to url can still be made given the cancel event and deadline,
+    and return the timeout, shortened to the time left before the deadline
+    """
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("Cancelled before request to {url}".format(**locals()))
+    if deadline is None:
+        return timeout
+    left = deadline - time.time()
+    if left <= 0:
+        raise DeadlineExceeded("Deadline passed before request to {url}".format(**locals()))
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) for t in timeout)
+    return min(timeout, left)
+
+
+def summarize(value, max_length=200):
+    """
+    Summarize a request payload for logging: long strings are replaced by their size
+    and long lists by their length, so large uploads are never formatted in full
+    """
+    if isinstance(value, (string_types, bytes)):
+        if len(value) > max_length:
+            return "<{} bytes>".format(len(value))
+        return repr(value)
+    if isinstance(value, dict):
+        return "{{{}}}".format(", ".join("{!r}: {}".format(k, summarize(v, max_length))
+                                         for (k, v) in value.items()))
+    if isinstance(value, (list, tuple)) and len(value) > 10:
+        return "<{} items>".format(len(value))
+    return repr(value)
+
+
+class RequestTracer(object):
+    """
+    Write a line of json to a file for (a random sample of) requests, with the method,
+    url, status, duration and request/response sizes, to diagnose slow jobs
+    """
+
+    def __init__(self, filename, sample_rate=1.0):
+        self.filename = filename
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+
+    def record(self, method, url, response, duration, data=None):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        size = len(data) if isinstance(data, (string_types, bytes)) else None
+        line = json.dumps(dict(time=time.time(), method=method, url=url, status=response.status_code,
+                               duration=round(duration, 4), request_bytes=size,
+                               response_bytes=len(response.content)))
+        with self.lock:
+            with open(self.filename, "a") as f:
+                f.write(line + "\n")
+
+
 def get_chunks(sequence, batch_size):
     # TODO can be made more efficient by not creating a new list every time
     buffer = []
@@ -432,6 +762,95 @@ def get_chunks(sequence, batch_size):
         yield buffer
 
 
+# fields that are not part of the content of an article, and are ignored when hashing
+HASH_IGNORE = {"id", "hash", "parent_hash", "parent", "sets", "project", "children", "uuid",
+               "insertdate", "insertscript"}
+
+def article_hash(article):
+    """
+    Compute the (client side) hash of an article dict, i.e. the sha224 of the
+    canonical json of its non-empty content fields (see HASH_IGNORE). Properties
+    nested in a 'properties' dict are hashed as if they were top-level fields.
+    """
+    fields = dict(article, **(article.get('properties') or {}))
+    fields = {k: v for (k, v) in fields.items()
+              if k not in HASH_IGNORE and k != 'properties' and v not in (None, "")}
+    data = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=serialize)
+    return hashlib.sha224(data.encode("utf-8")).hexdigest()
+
+
+class HashCache(object):
+    """
+    The hashes of the articles known to be in a target set, optionally stored in
+    a file so reruns of a scraper or copy don't upload the same articles again.
+    The cache is bound to the (host, project, articleset) it is first used for,
+    and refuses to be used for another set.
+    """
+    TARGET = "#target "
+
+    def __init__(self, filename=None):
+        self.filename = filename and os.path.expanduser(filename)
+        self.hashes = set()
+        self.target = None  # [host, project, articleset]
+        if self.filename and os.path.exists(self.filename):
+            with open(self.filename) as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith(self.TARGET):
+                        self.target = json.loads(line[len(self.TARGET):])
+                    elif line:
+                        self.hashes.add(line)
+
+    def bind(self, host, project, articleset):
+        """
+        Record the set that the cached articles are in
+        @raises ValueError: if the cache belongs to another set
+        """
+        target = [host, int(project), int(articleset)]
+        if self.target is None:
+            self.target = target
+            if self.filename:
+                with open(self.filename, "a") as f:
+                    f.write(self.TARGET + json.dumps(target) + "\n")
+        elif self.target != target:
+            raise ValueError("Hash cache {self.filename} belongs to set {self.target}, not {target}"
+                             .format(**locals()))
+
+    def __contains__(self, article):
+        return article_hash(article) in self.hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def new_articles(self, articles):
+        """Return the articles that are not in the cache (and not duplicated within articles)"""
+        result, seen = [], set()
+        for a in articles:
+            h = article_hash(a)
+            if h not in self.hashes and h not in seen:
+                seen.add(h)
+                result.append(a)
+        return result
+
+    def add(self, articles):
+        """Add the hashes of the given articles to the cache (and file)"""
+        new = {article_hash(a) for a in articles} - self.hashes
+        self.hashes |= new
+        if self.filename and new:
+            with open(self.filename, "a") as f:
+                f.writelines(h + "\n" for h in sorted(new))
+
+    def seed(self, api, project, articleset, page_size=1000):
+        """
+        Add the hashes of all articles currently in the set on the server. Since the
+        hash is computed on the client, this downloads all articles once; with a
+        cache file, later runs can skip this step.
+        """
+        self.bind(api.host, project, articleset)
+        articles = api.get_articles(project, articleset, all_columns=True, page_size=page_size)
+        self.add(articles)
+
+
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
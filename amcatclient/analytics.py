@@ -0,0 +1,163 @@
+###########################################################################
+#          (C) Vrije Universiteit, Amsterdam (the Netherlands)            #
+#                                                                         #
+# This file is part of AmCAT - The Amsterdam Content Analysis Toolkit     #
+#                                                                         #
+# AmCAT is free software: you can redistribute it and/or modify it under  #
+# the terms of the GNU Lesser General Public License as published by the  #
+# Free Software Foundation, either version 3 of the License, or (at your  #
+# option) any later version.                                              #
+#                                                                         #
+# AmCAT is distributed in the hope that it will be useful, but WITHOUT    #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or   #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public     #
+# License for more details.                                               #
+#                                                                         #
+# You should have received a copy of the GNU Lesser General Public        #
+# License along with AmCAT.  If not, see <http://www.gnu.org/licenses/>.  #
+###########################################################################
+
+"""
+Word counts and document-term matrices for (streams of) articles
+
+The functions here take any iterable of article dicts, such as the output of
+AmcatAPI.get_articles, and process it in batches so the whole set never needs
+to be in memory. Tokenization can be spread over multiple processes.
+
+document_term_matrix requires numpy and scipy, which are not installed
+automatically with amcatclient.
+"""
+
+import collections
+import itertools
+import logging
+import multiprocessing
+import re
+from array import array
+
+log = logging.getLogger(__name__)
+
+# letters and digits, splitting on underscores like the sqlite unicode61 tokenizer of local_index
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text, min_length=1):
+    """
+    Split text into lower case words of at least min_length characters.
+    Also used by local_index to count hits, so hit counts and word counts agree
+    """
+    if not text:
+        return []
+    words = _WORD.findall(text.lower())
+    if min_length > 1:
+        words = [w for w in words if len(w) >= min_length]
+    return words
+
+
+def _count_batch(args):
+    """Count the words per group in a batch of (group, text) pairs"""
+    batch, min_length = args
+    counts = collections.defaultdict(collections.Counter)
+    for group, text in batch:
+        counts[group].update(tokenize(text, min_length))
+    return counts
+
+
+def _tokenize_batch(args):
+    """Count the words per document in a batch of texts"""
+    texts, min_length = args
+    return [collections.Counter(tokenize(text, min_length)) for text in texts]
+
+
+def _batches(iterable, batch_size):
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def _map(func, batches, processes):
+    """Map func over the batches, using a process pool if processes is not None"""
+    if processes is None:
+        for batch in batches:
+            yield func(batch)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for result in pool.imap(func, batches):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _group_key(group_by):
+    if group_by is None or callable(group_by):
+        return group_by
+    if group_by == 'month':
+        return lambda a: (a.get('date') or '')[:7]
+    if group_by in ('date', 'day'):
+        return lambda a: (a.get('date') or '')[:10]
+    return lambda a: a.get(group_by)
+
+
+def count_words(articles, min_length=1, field='text', group_by=None, batch_size=1000, processes=None):
+    """
+    Count the words in the given articles
+    :param articles: an iterable of article dicts, e.g. from AmcatAPI.get_articles
+    :param min_length: ignore words shorter than this
+    :param field: the article field containing the text
+    :param group_by: if given, count separately per group. Can be an article field
+                     (e.g. 'medium' or 'publisher'), 'day' or 'month' to group on the
+                     date, or a function that takes an article and returns the group
+    :param batch_size: number of articles per batch (and per task if using processes)
+    :param processes: if given, tokenize in this many worker processes
+    :return: a Counter, or a dict of {group: Counter} if group_by is given
+    """
+    key = _group_key(group_by)
+    pairs = ((key(a) if key else None, a.get(field)) for a in articles)
+    batches = ((batch, min_length) for batch in _batches(pairs, batch_size))
+    result = collections.defaultdict(collections.Counter)
+    for counts in _map(_count_batch, batches, processes):
+        for group, c in counts.items():
+            result[group].update(c)
+    if key is None:
+        return result[None]
+    return dict(result)
+
+
+def document_term_matrix(articles, min_length=1, field='text', batch_size=1000, processes=None):
+    """
+    Create a sparse document-term matrix from the given articles
+    Parameters are as for count_words
+    :return: a tuple (matrix, ids, vocabulary), where matrix is a scipy.sparse.csr_matrix
+             with a row per article and a column per word, ids contains the article id for
+             each row and vocabulary the word for each column
+    """
+    import numpy
+    from scipy import sparse
+
+    ids = []
+    def collect(a):
+        ids.append(a.get('id'))
+        return a.get(field)
+    batches = ((batch, min_length) for batch in _batches((collect(a) for a in articles), batch_size))
+
+    vocabulary = {}
+    indptr, indices, data = array('q', [0]), array('q'), array('q')
+    for docs in _map(_tokenize_batch, batches, processes):
+        for counts in docs:
+            for word, n in counts.items():
+                indices.append(vocabulary.setdefault(word, len(vocabulary)))
+                data.append(n)
+            indptr.append(len(indices))
+        log.debug("Processed {} documents, vocabulary size {}".format(len(indptr) - 1, len(vocabulary)))
+
+    matrix = sparse.csr_matrix(tuple(numpy.frombuffer(a, dtype=numpy.int64) for a in (data, indices, indptr)),
+                               shape=(len(indptr) - 1, len(vocabulary)))
+    words = [None] * len(vocabulary)
+    for word, i in vocabulary.items():
+        words[i] = word
+    return matrix, ids, words
@@ -0,0 +1,151 @@
+###########################################################################
+#          (C) Vrije Universiteit, Amsterdam (the Netherlands)            #
+#                                                                         #
+# This file is part of AmCAT - The Amsterdam Content Analysis Toolkit     #
+#                                                                         #
+# AmCAT is free software: you can redistribute it and/or modify it under  #
+# the terms of the GNU Lesser General Public License as published by the  #
+# Free Software Foundation, either version 3 of the License, or (at your  #
+# option) any later version.                                              #
+#                                                                         #
+# AmCAT is distributed in the hope that it will be useful, but WITHOUT    #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or   #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public     #
+# License for more details.                                               #
+#                                                                         #
+# You should have received a copy of the GNU Lesser General Public        #
+# License along with AmCAT.  If not, see <http://www.gnu.org/licenses/>.  #
+###########################################################################
+
+"""
+Record and replay the HTTP requests of an AmcatAPI connection
+
+Record the requests of a job once:
+
+    conn = AmcatAPI(host, transport=Cassette("job.cassette", mode="record"))
+
+And replay them later without network access, optionally simulating the
+latency and bandwidth of the server, e.g. to compare batch sizes or
+concurrency settings:
+
+    conn = AmcatAPI(host, transport=Cassette("job.cassette", latency=0.05, bandwidth=10e6))
+
+Requests are identified by their method, url, parameters and body (but not
+their headers, so the auth token does not matter). Each response is stored
+as a gzipped json file named after the sha256 hash of the request. If the
+same request is made more than once, each response is stored separately
+(numbered by occurrence) and replayed in the same order; further repeats
+replay the last recorded response. Note that the cassette contains the
+recorded responses, including the auth token, so it is only readable by
+the current user.
+"""
+
+import collections
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from six import string_types
+
+
+class CassetteMiss(LookupError):
+    """Raised when replaying a request that was not recorded"""
+    pass
+
+
+class CassetteResponse(object):
+    """A recorded response, offering the parts of requests.Response used by AmcatAPI"""
+
+    def __init__(self, url, status_code, content_type, text):
+        self.url = url
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type} if content_type else {}
+        self.text = text
+        self.content = text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError("{self.status_code} Error for url: {self.url}".format(**locals()),
+                                     response=self)
+
+
+class Cassette(object):
+
+    def __init__(self, path, mode="playback", latency=0, bandwidth=None):
+        """
+        :param path: Directory to store the recorded responses in
+        :param mode: 'record' to make real requests and store the responses, or
+                     'playback' to only return stored responses
+        :param latency: (playback) seconds to wait before each response
+        :param bandwidth: (playback) simulated bytes per second for sending and receiving
+        """
+        if mode not in ("record", "playback"):
+            raise ValueError("Unknown mode: {mode}".format(**locals()))
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._seen = collections.Counter()  # key -> number of times the request was made
+        self._lock = threading.Lock()
+
+    def key(self, method, url, params=None, data=None):
+        """The hash identifying a request"""
+        if isinstance(data, dict) and 'password' in data:
+            data = dict(data, password=None)
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        request = [method.lower(), url, params or {}, data]
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def filename(self, key, n=1):
+        """The file of the n-th response to the request with this key"""
+        name = key if n == 1 else "{key}-{n}".format(**locals())
+        return os.path.join(self.path, key[:2], name + ".json.gz")
+
+    def __call__(self, method, url, data=None, params=None, headers=None, timeout=None):
+        key = self.key(method, url, params, data)
+        with self._lock:
+            self._seen[key] += 1
+            n = self._seen[key]
+        fn = self.filename(key, n)
+        if self.mode == "record":
+            r = requests.request(method, url, data=data, params=params, headers=headers, timeout=timeout)
+            response = CassetteResponse(r.url, r.status_code, r.headers.get('Content-Type'), r.text)
+            self._save(fn, response)
+            return r
+        while n > 1 and not os.path.exists(fn):
+            n -= 1
+            fn = self.filename(key, n)
+        if not os.path.exists(fn):
+            raise CassetteMiss("No recorded response for {method} {url} (params={params!r})".format(**locals()))
+        with gzip.open(fn, "rt") as f:
+            response = CassetteResponse(**json.load(f))
+        size = len(response.content) + (len(data) if isinstance(data, (string_types, bytes)) else 0)
+        delay = self.latency + (size / self.bandwidth if self.bandwidth else 0)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    def _save(self, fn, response):
+        # the responses contain the auth token, so keep them owner-only
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        os.makedirs(os.path.dirname(fn), mode=0o700, exist_ok=True)
+        # mkstemp creates a uniquely named file with mode 0600
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fn), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt") as f:
+                json.dump(dict(url=response.url, status_code=response.status_code,
+                               content_type=response.headers.get('Content-Type'), text=response.text), f)
+            os.replace(tmp, fn)
+        except:
+            os.remove(tmp)
+            raise
@@ -20,15 +20,19 @@
 """
 Copy articles to a different amcat server using the API
 
-Limitations: does not copy UUID or parent/child relations
+Limitations: does not copy UUID. Parent/child relations are only copied
+with --parents (preserve_parents=True).
 """
 
 import argparse
+import collections
 import requests
 import logging
 import itertools
+from concurrent.futures import ThreadPoolExecutor
 
-from amcatclient import AmcatAPI
+from amcatclient import AmcatAPI, HashCache
+from amcatclient.amcatclient import get_chunks
 
 
 
@@ -45,55 +49,157 @@ def create_set(src_api, src_project, src_set, trg_api, trg_project):
     else:
         s['provenance'] = provenance
 
-    result = trg.create_set(trg_project, s)
+    result = trg_api.create_set(trg_project, s)
     logging.info("Created set {id}:{name} in project {project}"
                  .format(**result))
     return result["id"]
 
 
+def convert(a, srcv, trgv):
+    """Convert a source article (from get_articles) to an article dict for the target"""
+    if srcv.minor == 5 and 'properties' in a:
+        a.update(a.pop('properties'))
+    a = {k: v for (k, v) in a.items() if v and k not in IGNORE_ARGS}
+    if not a.get('text'): a['text'] = "-"
+    # someone decided to rename headline to title in 3.5, so check and rename as needed
+    title = a.pop('headline', '-') if srcv.minor == 4 else a.pop("title", '-')
+    medium = a.pop('medium', None) if srcv.minor == 4 else a.pop("publisher", None)
+    if trgv.minor == 5:
+        a['title'] = title
+        if medium:
+            a['publisher'] = medium
+    if trgv.minor == 4:
+        a['headline'] = title
+        a['medium'] = medium or "-"
+    return a
+
+
 def copy_articles(src_api, src_project, src_set,
                   trg_api, trg_project, trg_set=None,
-                  batch_size=100, from_page=1):
+                  batch_size=100, from_page=1, hash_cache=None,
+                  preserve_parents=False, threads=4, deadline=None, cancel=None):
+    """
+    Copy all articles in the source set to the target set (which is created if not given)
+    :param preserve_parents: Copy parent/child relations, see ParentCopier
+    :param threads: Number of concurrent uploads (only used with preserve_parents)
+    :param deadline, cancel: Stop copying after the deadline or if cancel is set (see AmcatAPI.request)
+    """
+    limits = dict(deadline=deadline, cancel=cancel)
 
     srcv = src_api.get_version()
     trgv = trg_api.get_version()
 
     if not (srcv.major == 3 and trgv.major == 3 and srcv.minor in (4,5) and trgv.minor in (4,5)):
         raise Exception("copy_articles only possible between versions 3.4 and 3.5")
+    if preserve_parents and hash_cache is not None:
+        raise ValueError("Cannot skip copied articles when preserving parents, "
+                         "since the children of skipped articles could not be linked to their parent")
+    if trg_set is None and hash_cache is not None and (hash_cache.target is not None or len(hash_cache)):
+        raise ValueError("Hash cache {hash_cache.filename} contains articles of an existing set "
+                         "({hash_cache.target}), cannot use it for a new set".format(**locals()))
 
     if trg_set is None:
         trg_set = create_set(src_api, src_project, src_set, trg_api, trg_project)
-    if srcv.minor == 5:
+    if srcv.minor == 5 or preserve_parents:
         kargs = {}
     else:
         kargs = dict(order_by='parent')
-    articles = src_api.get_articles(src_project, src_set, page=from_page, page_size=batch_size, all_columns=True, **kargs)
+    articles = src_api.get_articles(src_project, src_set, page=from_page, page_size=batch_size, all_columns=True,
+                                    **dict(kargs, **limits))
+    copier = ParentCopier(trg_api, trg_project, trg_set, trgv, batch_size, threads, limits) if preserve_parents else None
     for i in itertools.count(from_page):
         batch = list(itertools.islice(articles, batch_size))
         if not batch:
+            if copier:
+                copier.finish()
             logging.info("Done")
             break
         logging.info("Copying batch {i}: {n} articles"
                      .format(n=len(batch), **locals()))
 
-        def convert(a):
-            if srcv.minor == 5 and 'properties' in a:
-                a.update(a.pop('properties'))
-            a = {k: v for (k, v) in a.items() if v and k not in IGNORE_ARGS}
-            if not a.get('text'): a['text'] = "-"
-            # someone decided to rename headline to title in 3.5, so check and rename as needed
-            title = a.pop('headline', '-') if srcv.minor == 4 else a.pop("title", '-')
-            medium = a.pop('medium', None) if srcv.minor == 4 else a.pop("publisher", None)
-            if trgv.minor == 5:
-                a['title'] = title
-                if medium:
-                    a['publisher'] = medium
-            if trgv.minor == 4:
-                a['headline'] = title
-                a['medium'] = medium or "-"
-            return a
-        batch = [convert(a) for a in batch]
-        trg_api.create_articles(trg_project, trg_set, batch, batch_size=batch_size)
+        if copier:
+            copier.add([(source_refs(a, srcv), convert(a, srcv, trgv)) for a in batch])
+        else:
+            batch = [convert(a, srcv, trgv) for a in batch]
+            trg_api.create_articles(trg_project, trg_set, batch, batch_size=batch_size, hash_cache=hash_cache, **limits)
+
+
+def source_refs(a, srcv):
+    """Return the key of a source article and the key of its parent (or None)"""
+    if srcv.minor == 5:
+        return a.get('hash'), a.get('parent_hash')
+    parent = a.get('parent')
+    if isinstance(parent, dict):
+        parent = parent.get('id')
+    return a.get('id'), parent
+
+
+class ParentCopier(object):
+    """
+    Upload articles to the target such that each article is linked to the copy of its parent.
+
+    Source articles are identified by their hash (3.5) or id (3.4), and mapped to the
+    hash (3.5) or id (3.4) of their copy on the target. Articles whose parent has not
+    been uploaded yet are kept until it is. Articles that can be uploaded are sent in
+    levels: first all articles whose parent is known, then the children of those, etc.,
+    with the batches of each level uploaded concurrently.
+    """
+
+    def __init__(self, trg_api, trg_project, trg_set, trgv, batch_size=100, threads=4, limits=None):
+        self.trg_api = trg_api
+        self.trg_project = trg_project
+        self.trg_set = trg_set
+        self.trgv = trgv
+        self.batch_size = batch_size
+        self.limits = limits or {}  # deadline and cancel event for the uploads
+        self.pool = ThreadPoolExecutor(threads)
+        self.targets = {}  # source key -> target id (3.4) or hash (3.5)
+        self.orphans = collections.defaultdict(list)  # source parent key -> [(key, parent, article)]
+
+    def add(self, articles):
+        """Add a batch of ((key, parent), article) pairs, uploading all articles whose parent is known"""
+        ready = []
+        for (key, parent), a in articles:
+            a.pop('parent', None)
+            if parent is None or parent in self.targets:
+                ready.append((key, parent, a))
+            else:
+                self.orphans[parent].append((key, parent, a))
+        self._upload(ready)
+
+    def finish(self):
+        """
+        Upload the articles whose parent was never seen (e.g. it is not in the source set).
+        Only the roots of the remaining trees lose their parent, their descendants are
+        still linked to them.
+        """
+        pending = {key for items in self.orphans.values() for (key, _, _) in items}
+        roots = [parent for parent in self.orphans if parent not in pending] or list(self.orphans)[:1]
+        while self.orphans:
+            ready = [item for parent in roots for item in self.orphans.pop(parent)]
+            logging.warning("Parent of {n} articles not found, copying them without parent"
+                            .format(n=len(ready)))
+            self._upload(ready)
+            # whatever is left is part of a parent cycle, so break it at one article
+            roots = list(self.orphans)[:1]
+        self.pool.shutdown()
+
+    def _upload(self, ready):
+        while ready:
+            chunks = list(get_chunks(ready, self.batch_size))
+            for chunk, result in zip(chunks, self.pool.map(self._upload_chunk, chunks)):
+                for (key, _, _), r in zip(chunk, result):
+                    if key is not None:
+                        self.targets[key] = r['hash'] if self.trgv.minor == 5 else r['id']
+            ready = [item for (key, _, _) in ready for item in self.orphans.pop(key, [])]
+
+    def _upload_chunk(self, chunk):
+        parent_field = 'parent_hash' if self.trgv.minor == 5 else 'parent'
+        articles = []
+        for key, parent, a in chunk:
+            target = self.targets.get(parent)
+            articles.append(dict(a, **{parent_field: target}) if target is not None else a)
+        return self.trg_api.create_articles(self.trg_project, self.trg_set, articles, batch_size=None, **self.limits)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(epilog=__doc__)
@@ -114,6 +220,12 @@ if __name__ == '__main__':
                         type=int, default=100)
     parser.add_argument("--from-page", "-p", help='Start from page (batch)',
                         type=int, default=1)
+    parser.add_argument("--hash-cache", help='File to keep the hashes of copied articles in. '
+                        'If given, articles that were copied before are skipped')
+    parser.add_argument("--parents", help='Copy parent/child relations',
+                        action='store_true')
+    parser.add_argument("--threads", "-t", help='Number of concurrent uploads (with --parents)',
+                        type=int, default=4)
 
 
     args = parser.parse_args()
@@ -128,4 +240,6 @@ if __name__ == '__main__':
 
     copy_articles(src, args.source_project, args.source_set,
                   trg, args.target_project, args.target_set,
-                  args.batch_size, args.from_page)
+                  args.batch_size, args.from_page,
+                  HashCache(args.hash_cache) if args.hash_cache else None,
+                  args.parents, args.threads)
@@ -0,0 +1,199 @@
+###########################################################################
+#          (C) Vrije Universiteit, Amsterdam (the Netherlands)            #
+#                                                                         #
+# This file is part of AmCAT - The Amsterdam Content Analysis Toolkit     #
+#                                                                         #
+# AmCAT is free software: you can redistribute it and/or modify it under  #
+# the terms of the GNU Lesser General Public License as published by the  #
+# Free Software Foundation, either version 3 of the License, or (at your  #
+# option) any later version.                                              #
+#                                                                         #
+# AmCAT is distributed in the hope that it will be useful, but WITHOUT    #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or   #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public     #
+# License for more details.                                               #
+#                                                                         #
+# You should have received a copy of the GNU Lesser General Public        #
+# License along with AmCAT.  If not, see <http://www.gnu.org/licenses/>.  #
+###########################################################################
+
+"""
+Run the same queries against multiple AmCAT servers concurrently
+
+Usage:
+
+    fed = FederatedAPI(["https://amcat.nl", "https://vu.amcat.nl"])
+    articles = fed.get_articles(PerHost({"https://amcat.nl": 1, "https://vu.amcat.nl": 7}),
+                                PerHost({"https://amcat.nl": 12, "https://vu.amcat.nl": 3}))
+    for a in articles:
+        print(a['host'], a['id'])
+
+Results of all servers are merged as they arrive, and each result is tagged
+with the host it came from. If a server fails, its error is logged and
+stored in the errors dict, and the results of the other servers are still
+returned. Servers that could not be connected to are left out, and their
+errors are kept in connect_errors.
+"""
+
+import collections
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from six.moves import queue
+
+from amcatclient.amcatclient import AmcatAPI
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class PerHost(object):
+    """An argument value that differs per host, e.g. project or articleset ids"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, host):
+        return self.values[host]
+
+
+def _resolve(host, args, kargs):
+    args = [a.get(host) if isinstance(a, PerHost) else a for a in args]
+    kargs = {k: v.get(host) if isinstance(v, PerHost) else v for (k, v) in kargs.items()}
+    return args, kargs
+
+
+class FederatedAPI(object):
+
+    def __init__(self, apis, **kargs):
+        """
+        :param apis: A list of AmcatAPI objects and/or hosts. Hosts are connected to
+                     concurrently, passing kargs to AmcatAPI. Hosts that cannot be
+                     connected to are left out (see connect_errors)
+        """
+        self.connect_errors = {}  # host -> exception on connecting
+        self.errors = {}  # host -> exception of the last call
+        hosts = [a for a in apis if not isinstance(a, AmcatAPI)]
+        with ThreadPoolExecutor(max(len(hosts), 1)) as pool:
+            futures = {host: pool.submit(AmcatAPI, host, **kargs) for host in hosts}
+        self.apis = collections.OrderedDict()
+        for a in apis:
+            if isinstance(a, AmcatAPI):
+                self.apis[a.host] = a
+                continue
+            try:
+                self.apis[a] = futures[a].result()
+            except Exception as e:
+                log.exception("Cannot connect to {a}, skipping it".format(**locals()))
+                self.connect_errors[a] = e
+
+    def call(self, method, *args, **kargs):
+        """
+        Call the method (name) on all servers concurrently. Arguments can be PerHost values.
+        :return: a dict of {host: result} for the servers that did not fail
+        """
+        self.errors = {}
+
+        def call(host):
+            a, k = _resolve(host, args, kargs)
+            return getattr(self.apis[host], method)(*a, **k)
+
+        with ThreadPoolExecutor(max(len(self.apis), 1)) as pool:
+            futures = [(host, pool.submit(call, host)) for host in self.apis]
+            result = collections.OrderedDict()
+            for host, future in futures:
+                try:
+                    result[host] = future.result()
+                except Exception as e:
+                    log.exception("Error on calling {method} on {host}".format(**locals()))
+                    self.errors[host] = e
+            return result
+
+    def stream(self, method, *args, host_key='host', **kargs):
+        """
+        Call a method that returns a generator (e.g. get_articles) on all servers
+        concurrently, and yield the results (dicts) as they arrive, with an
+        added host_key key. Arguments can be PerHost values.
+        :param host_key: The key to store the host in. If a result already has this
+                         key, the call fails for that server (choose another host_key)
+        """
+        self.errors = {}
+        results = queue.Queue(maxsize=1000)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch(host):
+            try:
+                a, k = _resolve(host, args, kargs)
+                for row in getattr(self.apis[host], method)(*a, cancel=stop, **k):
+                    if host_key in row:
+                        raise ValueError("Result already has a {host_key!r} field, use another host_key"
+                                         .format(**locals()))
+                    if not put(dict(row, **{host_key: host})):
+                        return
+            except Exception as e:
+                if not stop.is_set():
+                    log.exception("Error on calling {method} on {host}".format(**locals()))
+                    self.errors[host] = e
+            finally:
+                put(_DONE)
+
+        threads = [threading.Thread(target=fetch, args=(host,)) for host in self.apis]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        try:
+            todo = len(threads)
+            while todo:
+                row = results.get()
+                if row is _DONE:
+                    todo -= 1
+                else:
+                    yield row
+        finally:
+            stop.set()
+
+    def get_articles(self, *args, **kargs):
+        """Get the articles from all servers, see AmcatAPI.get_articles"""
+        return self.stream("get_articles", *args, **kargs)
+
+    def search(self, *args, **kargs):
+        """Search on all servers, see AmcatAPI.search"""
+        return self.stream("search", *args, **kargs)
+
+    def aggregate(self, combine=False, measures=('count',), host_key='host', **filters):
+        """
+        Conduct an aggregate query on all servers
+        :param combine: If True, add up the measures of rows with the same values in all
+                        other columns (the axes) across servers. Otherwise, return the
+                        rows per server with a host_key key
+        :param measures: The columns to add up when combining, other (numeric) columns
+                         such as a year or medium id are part of the grouping key
+        :return: a list of aggregate rows
+        """
+        rows = list(self.stream("aggregate", host_key=host_key, **filters))
+        if not combine:
+            return rows
+        combined = collections.OrderedDict()
+        for row in rows:
+            row.pop(host_key)
+            key = json.dumps({k: v for (k, v) in row.items() if k not in measures}, sort_keys=True, default=str)
+            if key in combined:
+                target = combined[key]
+                for k in measures:
+                    if k in row:
+                        target[k] = target.get(k, 0) + row[k]
+            else:
+                combined[key] = row
+        return list(combined.values())
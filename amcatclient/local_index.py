@@ -0,0 +1,327 @@
+###########################################################################
+#          (C) Vrije Universiteit, Amsterdam (the Netherlands)            #
+#                                                                         #
+# This file is part of AmCAT - The Amsterdam Content Analysis Toolkit     #
+#                                                                         #
+# AmCAT is free software: you can redistribute it and/or modify it under  #
+# the terms of the GNU Lesser General Public License as published by the  #
+# Free Software Foundation, either version 3 of the License, or (at your  #
+# option) any later version.                                              #
+#                                                                         #
+# AmCAT is distributed in the hope that it will be useful, but WITHOUT    #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or   #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public     #
+# License for more details.                                               #
+#                                                                         #
+# You should have received a copy of the GNU Lesser General Public        #
+# License along with AmCAT.  If not, see <http://www.gnu.org/licenses/>.  #
+###########################################################################
+
+"""
+Local (offline) full text index of downloaded article sets
+
+Articles from get_articles(..., all_columns=True) are stored in an SQLite
+database with an FTS5 full text index, which can then be queried using the
+same query syntax and result rows as AmcatAPI.search, but without contacting
+the server.
+
+Supported query syntax: terms, prefix terms (term*), "phrases", AND, OR, NOT
+(also && and || and -term), parentheses and field:term for the title (or
+headline) and text fields. As in AmCAT, terms without an operator are combined
+with OR. Other lucene syntax (wildcards, fuzzy or proximity search, boosts,
+ranges and +term) raises a ValueError.
+
+Requires an sqlite3 build with FTS5 (included in most Python distributions).
+"""
+
+import argparse
+import json
+import logging
+import re
+import sqlite3
+
+from amcatclient.amcatclient import serialize
+from amcatclient.analytics import tokenize
+
+log = logging.getLogger(__name__)
+
+FIELDS = {"title": "title", "headline": "title", "text": "text"}
+
+_QUERY_TOKEN = re.compile(r'\s*(?:(?P<phrase>"[^"]*")|(?P<paren>[()])|(?P<word>[^\s()"]+))')
+_OPERATORS = {"&&": "AND", "||": "OR"}
+_UNSUPPORTED = set('*?~^[]{}\\/+!')
+
+
+class _Phrase(object):
+    """A term or phrase in a query, which is counted as a hit if it occurs outside a NOT"""
+    def __init__(self, tokens, prefix=False, field=None):
+        self.tokens = tokens
+        self.prefix = prefix
+        self.field = field
+
+    def fts(self):
+        q = '"{}"'.format(" ".join(self.tokens))
+        if self.prefix:
+            q += " *"
+        if self.field:
+            q = "{} : {}".format(self.field, q)
+        return q
+
+    def count(self, fields):
+        n = 0
+        for field, tokens in fields.items():
+            if self.field and field != self.field:
+                continue
+            k = len(self.tokens)
+            for i in range(len(tokens) - k + 1):
+                window = tokens[i:i+k]
+                if window[:-1] == self.tokens[:-1] and (
+                        window[-1].startswith(self.tokens[-1]) if self.prefix else window[-1] == self.tokens[-1]):
+                    n += 1
+        return n
+
+
+class _QueryParser(object):
+    """
+    Recursive descent parser that translates a lucene-style query into an FTS5 query:
+      expr := conj ([OR] conj)*
+      conj := [NOT] unary ((AND | [AND] NOT) unary)*
+      unary := '(' expr ')' | [field:] (term | "phrase")
+    -term is read as NOT term, and && and || as AND and OR. As in lucene, negated
+    terms without a positive term in their conjunction (e.g. '-b a' or 'a OR NOT b')
+    exclude documents from the whole expression.
+    """
+    def __init__(self, query):
+        self.query = query
+        self.tokens = []
+        for m in _QUERY_TOKEN.finditer(query):
+            token = m.group(0).strip()
+            if not token:
+                continue
+            if token.startswith("-") and m.group('word'):
+                self.tokens.append("NOT")
+                token = token[1:]
+                if not token:
+                    continue
+            self.tokens.append(_OPERATORS.get(token, token))
+        self.pos = 0
+        self.phrases = []
+
+    def parse(self):
+        """
+        :return: a pair (match, exclude) of FTS5 queries, one of which is None. If the
+                 query has no positive terms, exclude matches the documents to leave out
+        """
+        if not self.tokens:
+            raise ValueError("Empty query")
+        pos, neg = self._expr(negated=False)
+        if self.pos < len(self.tokens):
+            self._error("Unexpected {!r}".format(self.tokens[self.pos]))
+        if pos:
+            return self._combine(pos, neg), None
+        return None, " OR ".join(neg)
+
+    def _error(self, msg):
+        raise ValueError("Cannot parse query {self.query!r}: {msg}".format(**locals()))
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _combine(self, pos, neg):
+        result = pos[0] if len(pos) == 1 else "({})".format(" AND ".join(pos))
+        for n in neg:
+            result = "({result} NOT {n})".format(**locals())
+        return result
+
+    def _expr(self, negated):
+        """Return the positive and negated parts of the expression"""
+        parts = [self._conj(negated)]
+        while self._peek() not in (None, ")"):
+            if self._peek() == "OR":
+                self._next()
+            parts.append(self._conj(negated))
+        pos = [self._combine(p, n) for (p, n) in parts if p]
+        neg = [x for (p, n) in parts if not p for x in n]
+        if len(pos) > 1:
+            pos = ["({})".format(" OR ".join(pos))]
+        return pos, neg
+
+    def _conj(self, negated):
+        """Return the positive and negated operands of the conjunction"""
+        pos, neg = [], []
+        op = "AND"
+        while True:
+            if self._peek() == "NOT":
+                self._next()
+                op = "NOT"
+            if op == "AND":
+                pos.append(self._unary(negated))
+            else:
+                neg.append(self._unary(not negated))
+            if self._peek() == "AND":
+                self._next()
+                op = "AND"
+            elif self._peek() != "NOT":
+                return pos, neg
+
+    def _unary(self, negated):
+        token = self._next()
+        if token is None:
+            self._error("Unexpected end of query")
+        if token in ("AND", "OR", "NOT", ")"):
+            self._error("Unexpected {token!r}".format(**locals()))
+        if token == "(":
+            pos, neg = self._expr(negated)
+            if self._next() != ")":
+                self._error("Missing closing parenthesis")
+            if not pos:
+                self._error("Parenthesized part has only negated terms")
+            return "({})".format(self._combine(pos, neg))
+        field = None
+        if ":" in token and not token.startswith('"'):
+            name, token = token.split(":", 1)
+            if name.lower() not in FIELDS:
+                self._error("Unknown field {name!r}".format(**locals()))
+            field = FIELDS[name.lower()]
+            if not token:
+                token = self._next()
+                if token is None or not token.startswith('"'):
+                    self._error("Expected a phrase after {name}:".format(**locals()))
+        if not token.startswith('"'):
+            if token[0] in "+!":
+                self._error("{!r} prefix is not supported, use AND or NOT".format(token[0]))
+            if any(c in _UNSUPPORTED for c in token.rstrip("*")):
+                self._error("Unsupported syntax in {token!r} (supported are terms, "
+                            "prefix* terms, \"phrases\", AND, OR, NOT and field:term)".format(**locals()))
+        prefix = token.endswith("*") and not token.startswith('"')
+        tokens = tokenize(token.strip('"').rstrip("*") if prefix else token.strip('"'))
+        if not tokens:
+            self._error("Term {token!r} contains no words".format(**locals()))
+        phrase = _Phrase(tokens, prefix=prefix, field=field)
+        if not negated:
+            self.phrases.append(phrase)
+        return phrase.fts()
+
+
+def parse_query(query):
+    """
+    Parse a lucene-style query
+    @return: a tuple of the FTS5 query to match, the FTS5 query to exclude (if the query
+             has only negated terms, otherwise one of them is None) and a list of phrases to count as hits
+    """
+    parser = _QueryParser(query)
+    match, exclude = parser.parse()
+    return match, exclude, parser.phrases
+
+
+class LocalIndex(object):
+
+    def __init__(self, path=":memory:"):
+        """
+        Open (or create) a local index
+        :param path: The SQLite database file, or ':memory:' for a temporary index
+        """
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (id INTEGER PRIMARY KEY, meta TEXT);
+            CREATE TABLE IF NOT EXISTS articlesets (articleset INTEGER, article INTEGER,
+                                                    PRIMARY KEY (articleset, article));
+            CREATE VIRTUAL TABLE IF NOT EXISTS fulltext
+                USING fts5(title, text, tokenize='unicode61 remove_diacritics 0');
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def add_articles(self, articles, articleset):
+        """
+        Add articles (dicts as returned by get_articles with all_columns=True) to the index
+        :return: the number of articles added
+        """
+        n = 0
+        with self.db:
+            for a in articles:
+                a = dict(a)
+                if 'properties' in a:  # amcat 3.5
+                    a.update(a.pop('properties'))
+                aid = a.pop('id')
+                title = a.pop('title', None) or a.pop('headline', None) or ""
+                text = a.pop('text', None) or ""
+                self.db.execute("INSERT OR REPLACE INTO articles VALUES (?, ?)",
+                                (aid, json.dumps(a, default=serialize)))
+                self.db.execute("INSERT OR IGNORE INTO articlesets VALUES (?, ?)", (articleset, aid))
+                self.db.execute("DELETE FROM fulltext WHERE rowid = ?", (aid,))
+                self.db.execute("INSERT INTO fulltext (rowid, title, text) VALUES (?, ?, ?)", (aid, title, text))
+                n += 1
+        return n
+
+    def index_articleset(self, api, project, articleset, page_size=1000):
+        """
+        Download all articles in a set from the server and add them to the index
+        :param api: the AmcatAPI connection
+        """
+        articles = api.get_articles(project, articleset, all_columns=True, page_size=page_size)
+        n = self.add_articles(articles, articleset)
+        log.info("Indexed {n} articles from set {project}:{articleset}".format(**locals()))
+        return n
+
+    def search(self, articleset, query, columns=['hits']):
+        """
+        Search the indexed articles, mirroring AmcatAPI.search
+        :param articleset: article set id, or a list of ids
+        :param columns: columns to return next to the id: 'hits' and/or article fields
+        :return: a generator of dicts with the article id and requested columns
+        """
+        sets = articleset if isinstance(articleset, (list, tuple, set)) else [articleset]
+        match, exclude, phrases = parse_query(query)
+        inset = "a.id IN (SELECT article FROM articlesets WHERE articleset IN ({}))".format(",".join("?" * len(sets)))
+        if match is not None:
+            sql = ("SELECT f.rowid, f.title, f.text, a.meta FROM fulltext f JOIN articles a ON a.id = f.rowid"
+                   " WHERE fulltext MATCH ? AND {inset} ORDER BY f.rowid".format(**locals()))
+            params = [match] + list(sets)
+        else:
+            sql = ("SELECT f.rowid, f.title, f.text, a.meta FROM fulltext f JOIN articles a ON a.id = f.rowid"
+                   " WHERE {inset} AND a.id NOT IN (SELECT rowid FROM fulltext WHERE fulltext MATCH ?)"
+                   " ORDER BY f.rowid".format(**locals()))
+            params = list(sets) + [exclude]
+        for aid, title, text, meta in self.db.execute(sql, params):
+            row = {'id': aid}
+            if 'hits' in columns:
+                fields = {'title': tokenize(title), 'text': tokenize(text)}
+                row['hits'] = sum(p.count(fields) for p in phrases)
+            other = [c for c in columns if c != 'hits']
+            if other:
+                meta = dict(json.loads(meta), title=title, headline=title, text=text)
+                row.update({c: meta.get(c) for c in other})
+            yield row
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("index", help="Filename of the local index")
+    action_parser = parser.add_subparsers(dest='action', title='Actions')
+
+    p = action_parser.add_parser("add", help="Download an article set into the index")
+    p.add_argument("server", help="Server hostname (e.g. https://amcat.nl)")
+    p.add_argument("project", help="Project ID", type=int)
+    p.add_argument("articleset", help="Article Set ID", type=int)
+
+    p = action_parser.add_parser("search", help="Search the index")
+    p.add_argument("articleset", help="Article Set ID", type=int)
+    p.add_argument("query", help="Query, e.g. 'war OR \"armed conflict\"'")
+
+    args = parser.parse_args()
+    logging.basicConfig(format='[%(asctime)s %(levelname)s %(name)s] %(message)s', level=logging.INFO)
+
+    index = LocalIndex(args.index)
+    if args.action == "add":
+        from amcatclient import AmcatAPI
+        index.index_articleset(AmcatAPI(args.server), args.project, args.articleset)
+    elif args.action == "search":
+        for row in index.search(args.articleset, args.query):
+            print(json.dumps(row))
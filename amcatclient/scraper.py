@@ -0,0 +1,171 @@
+###########################################################################
+#          (C) Vrije Universiteit, Amsterdam (the Netherlands)            #
+#                                                                         #
+# This file is part of AmCAT - The Amsterdam Content Analysis Toolkit     #
+#                                                                         #
+# AmCAT is free software: you can redistribute it and/or modify it under  #
+# the terms of the GNU Lesser General Public License as published by the  #
+# Free Software Foundation, either version 3 of the License, or (at your  #
+# option) any later version.                                              #
+#                                                                         #
+# AmCAT is distributed in the hope that it will be useful, but WITHOUT    #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or   #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public     #
+# License for more details.                                               #
+#                                                                         #
+# You should have received a copy of the GNU Lesser General Public        #
+# License along with AmCAT.  If not, see <http://www.gnu.org/licenses/>.  #
+###########################################################################
+
+"""
+Base class for scrapers that upload articles to AmCAT
+
+A scraper subclasses Scraper and implements get_urls (the starting pages)
+and parse (turn the html of a page into articles and/or more urls to scrape).
+Pages are fetched concurrently, with a limit on the number of parallel
+requests per domain (further pages of a busy domain are queued, so they do not
+occupy fetch threads), parsed in a pool of processes (if parse_processes is
+given), and the resulting articles are uploaded in batches across pages.
+
+To test a scraper offline, override fetch to read saved html files, and
+iterate over scrape() instead of calling run().
+"""
+
+import collections
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from six.moves.urllib.parse import urlparse
+
+from amcatclient.amcatclient import get_chunks, Cancelled, DeadlineExceeded
+
+log = logging.getLogger(__name__)
+
+
+class Scraper(object):
+    fetch_threads = 16
+    max_per_domain = 4
+    parse_processes = None
+    timeout = 60
+
+    def get_urls(self):
+        """Return the urls of the pages to start scraping from"""
+        raise NotImplementedError()
+
+    def parse(self, url, html):
+        """
+        Parse the html of the page at url. If parse_processes is given, this is
+        called in a separate process, so the scraper object needs to be picklable.
+        :return: an iterable of article dicts and/or urls of further pages to scrape
+        """
+        raise NotImplementedError()
+
+    def fetch(self, url):
+        """Return the html of the page at url"""
+        r = requests.get(url, timeout=self.timeout)
+        r.raise_for_status()
+        return r.text
+
+    def _fetch_and_parse(self, url):
+        return self.parse_page(url, self.fetch(url))
+
+    def scrape(self, deadline=None, cancel=None):
+        """
+        Scrape all pages, following the urls returned by parse
+        :param deadline, cancel: Stop scraping (and cancel pending pages) after the deadline
+                                 or if cancel is set (see AmcatAPI.request)
+        :return: a generator of article dicts
+        """
+        fetch_pool = ThreadPoolExecutor(self.fetch_threads)
+        parse_pool = ProcessPoolExecutor(self.parse_processes) if self.parse_processes else None
+        tasks = {}  # future -> (task, url)
+        seen = set()
+        queued = collections.defaultdict(collections.deque)  # domain -> urls waiting for a free slot
+        active = collections.Counter()  # domain -> number of urls being fetched
+
+        def submit(domain):
+            while queued[domain] and active[domain] < self.max_per_domain:
+                url = queued[domain].popleft()
+                active[domain] += 1
+                if parse_pool:
+                    tasks[fetch_pool.submit(self.fetch, url)] = ("fetch", url)
+                else:
+                    tasks[fetch_pool.submit(self._fetch_and_parse, url)] = ("parse", url)
+
+        def schedule(url):
+            if url not in seen:
+                seen.add(url)
+                domain = urlparse(url).netloc
+                queued[domain].append(url)
+                submit(domain)
+
+        try:
+            for url in self.get_urls():
+                schedule(url)
+            while tasks:
+                # wake up at least every second to notice a cancel
+                timeout = 1 if deadline is None else min(max(0, deadline - time.time()), 1)
+                done, _ = wait(list(tasks), timeout=timeout, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled("Scraping cancelled with {} pages pending".format(len(tasks)))
+                if deadline is not None and time.time() >= deadline:
+                    raise DeadlineExceeded("Scraping deadline passed with {} pages pending".format(len(tasks)))
+                for future in done:
+                    task, url = tasks.pop(future)
+                    if task == "fetch" or not parse_pool:
+                        domain = urlparse(url).netloc
+                        active[domain] -= 1
+                        submit(domain)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        log.exception("Error on scraping {url}".format(**locals()))
+                        continue
+                    if task == "fetch":
+                        tasks[parse_pool.submit(self.parse_page, url, result)] = ("parse", url)
+                        continue
+                    for item in result:
+                        if isinstance(item, dict):
+                            yield item
+                        else:
+                            schedule(item)
+        finally:
+            for future in tasks:
+                future.cancel()
+            fetch_pool.shutdown(wait=False)
+            if parse_pool:
+                parse_pool.shutdown(wait=False)
+
+    def parse_page(self, url, html):
+        """Parse the page into a list (rather than an iterator, so it can be sent between processes)"""
+        return list(self.parse(url, html))
+
+    def run(self, conn, project, articleset, batch_size=100, hash_cache=None, deadline=None, cancel=None):
+        """
+        Scrape all pages and upload the articles to the articleset.
+        Uploading happens in the background while scraping continues.
+        :param conn: The AmcatAPI object
+        :param hash_cache: Optional HashCache to skip articles that were uploaded before
+        :param deadline, cancel: see scrape, also applied to the uploads
+        :return: the number of scraped articles
+        """
+        n = 0
+        upload_pool = ThreadPoolExecutor(1)
+        upload = None
+        try:
+            for batch in get_chunks(self.scrape(deadline, cancel), batch_size):
+                if upload is not None:
+                    upload.result()
+                n += len(batch)
+                log.info("Uploading {} articles to set {project}:{articleset} ({n} scraped so far)"
+                         .format(len(batch), **locals()))
+                upload = upload_pool.submit(conn.create_articles, project=project, articleset=articleset,
+                                            json_data=batch, batch_size=None, hash_cache=hash_cache,
+                                            deadline=deadline, cancel=cancel)
+            if upload is not None:
+                upload.result()
+        finally:
+            upload_pool.shutdown()
+        return n
@@ -0,0 +1,225 @@
+###########################################################################
+#          (C) Vrije Universiteit, Amsterdam (the Netherlands)            #
+#                                                                         #
+# This file is part of AmCAT - The Amsterdam Content Analysis Toolkit     #
+#                                                                         #
+# AmCAT is free software: you can redistribute it and/or modify it under  #
+# the terms of the GNU Lesser General Public License as published by the  #
+# Free Software Foundation, either version 3 of the License, or (at your  #
+# option) any later version.                                              #
+#                                                                         #
+# AmCAT is distributed in the hope that it will be useful, but WITHOUT    #
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or   #
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public     #
+# License for more details.                                               #
+#                                                                         #
+# You should have received a copy of the GNU Lesser General Public        #
+# License along with AmCAT.  If not, see <http://www.gnu.org/licenses/>.  #
+###########################################################################
+
+"""
+Local store of downloaded articles for fast repeated reading
+
+A store is a directory containing:
+- meta.json: the column names and number of articles
+- data: the values of all article fields. Strings are stored as utf-8 prefixed
+  by 's', other values (including None) as json prefixed by 'j'. The
+  'properties' of AmCAT 3.5 articles are stored as separate columns
+- index: a fixed-width record per article, sorted by article id, containing the
+  id and the offset and length in data of each column (length 0 if missing)
+
+Both data and index are memory mapped when reading, so articles can be looked
+up by id (binary search over the index) and only the requested columns are
+read and decoded.
+
+Create a store with AmcatAPI.save_articles, or write_store for any iterable
+of article dicts.
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from six import string_types
+
+from amcatclient.amcatclient import serialize
+
+META, DATA, INDEX = "meta.json", "data", "index"
+STRING, JSON = b"s", b"j"
+
+
+def _record_struct(ncolumns):
+    return struct.Struct("<q" + "QI" * ncolumns)
+
+
+class ArticleStoreWriter(object):
+
+    def __init__(self, path):
+        """Create a new store in the directory path"""
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.path = path
+        self.data = open(os.path.join(path, DATA), "wb")
+        self.offset = 0
+        self.columns = {}  # name -> column number
+        # per article its id and the start of its (column, offset, length) triples in fields
+        self.ids, self.starts, self.fields = array('q'), array('q'), array('q')
+
+    def add(self, article):
+        if 'properties' in article:  # amcat 3.5
+            article = dict(article)
+            article.update(article.pop('properties'))
+        self.ids.append(article['id'])
+        self.starts.append(len(self.fields))
+        for column, value in article.items():
+            if column == 'id':
+                continue
+            if isinstance(value, string_types):
+                value = STRING + value.encode("utf-8")
+            else:
+                value = JSON + json.dumps(value, default=serialize).encode("utf-8")
+            self.data.write(value)
+            self.fields.extend((self.columns.setdefault(column, len(self.columns)), self.offset, len(value)))
+            self.offset += len(value)
+
+    def close(self):
+        self.data.close()
+        columns = sorted(self.columns, key=self.columns.get)
+        record = _record_struct(len(columns))
+        self.starts.append(len(self.fields))
+        with open(os.path.join(self.path, INDEX), "wb") as f:
+            for i in sorted(range(len(self.ids)), key=self.ids.__getitem__):
+                values = [self.ids[i]] + [0, 0] * len(columns)
+                for j in range(self.starts[i], self.starts[i+1], 3):
+                    column, offset, length = self.fields[j:j+3]
+                    values[1 + 2*column], values[2 + 2*column] = offset, length
+                f.write(record.pack(*values))
+        with open(os.path.join(self.path, META), "w") as f:
+            json.dump({"columns": columns, "count": len(self.ids)}, f)
+        return len(self.ids)
+
+
+def write_store(path, articles):
+    """
+    Write the articles (e.g. from AmcatAPI.get_articles) to a new store at path
+    :return: the ArticleStore, opened for reading
+    """
+    writer = ArticleStoreWriter(path)
+    for a in articles:
+        writer.add(a)
+    writer.close()
+    return ArticleStore(path)
+
+
+def _mmap(fn):
+    with open(fn, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ArticleStore(object):
+
+    def __init__(self, path):
+        """Open the store in the directory path for reading"""
+        with open(os.path.join(path, META)) as f:
+            meta = json.load(f)
+        self.path = path
+        self.columns = meta['columns']
+        self.count = meta['count']
+        self._columns = {c: i for (i, c) in enumerate(self.columns)}
+        self._record = _record_struct(len(self.columns))
+        self._id = struct.Struct("<q")
+        self._data = _mmap(os.path.join(path, DATA))
+        self._index = _mmap(os.path.join(path, INDEX))
+
+    def close(self):
+        for m in (self._data, self._index):
+            if isinstance(m, mmap.mmap):
+                m.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, article_id):
+        return self._find(article_id) is not None
+
+    def __iter__(self):
+        return self.iter_articles()
+
+    def _find(self, article_id):
+        """Binary search for the position of article_id in the index"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_id = self._id.unpack_from(self._index, mid * self._record.size)[0]
+            if mid_id < article_id:
+                lo = mid + 1
+            elif mid_id > article_id:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def _article(self, i, columns):
+        record = self._record.unpack_from(self._index, i * self._record.size)
+        article = {'id': record[0]}
+        for column in columns:
+            c = self._columns.get(column)
+            if c is None:
+                continue
+            offset, length = record[1 + 2*c], record[2 + 2*c]
+            if not length:
+                continue
+            value = self._data[offset+1:offset+length]
+            if self._data[offset:offset+1] == STRING:
+                article[column] = value.decode("utf-8")
+            else:
+                article[column] = json.loads(value.decode("utf-8"))
+        return article
+
+    def ids(self):
+        """Return the ids of all articles (in order)"""
+        return [self._id.unpack_from(self._index, i * self._record.size)[0] for i in range(self.count)]
+
+    def get(self, article_id, columns=None):
+        """
+        Get a single article
+        :param columns: the columns to read (default: all)
+        """
+        i = self._find(article_id)
+        if i is None:
+            raise KeyError(article_id)
+        return self._article(i, columns or self.columns)
+
+    def iter_articles(self, columns=None):
+        """Yield all articles in order of id, reading only the given columns (default: all)"""
+        columns = columns or self.columns
+        for i in range(self.count):
+            yield self._article(i, columns)
+
+    def scroll(self, page_size=1000, yield_pages=False, columns=None):
+        """
+        Iterate over the articles like AmcatAPI.get_scroll
+        :param yield_pages: yield whole pages (dicts with results, next and total)
+                            rather than individual articles
+        """
+        if not yield_pages:
+            return self.iter_articles(columns)
+        return self._pages(page_size, columns)
+
+    def _pages(self, page_size, columns):
+        columns = columns or self.columns
+        for page, start in enumerate(range(0, self.count, page_size), start=1):
+            end = min(start + page_size, self.count)
+            yield {'results': [self._article(i, columns) for i in range(start, end)],
+                   'page': page, 'total': self.count,
+                   'next': page + 1 if end < self.count else None}
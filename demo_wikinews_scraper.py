@@ -115,12 +115,13 @@ def date_of_unit(self, doc):
 ###       AmCAT functionality: connect to API and add articles     ###
 ######################################################################
 
-def scrape_wikinews(conn, project, articleset, query):
+def scrape_wikinews(conn, project, articleset, query, hash_cache=None):
     """
     Scrape wikinews articles from the given query
     @param conn: The AmcatAPI object
     @param articleset: The target articleset ID
     @param category: The wikinews category name
+    @param hash_cache: Optional HashCache to skip articles that were uploaded before
     """
     url = "http://en.wikinews.org/w/index.php?search={}&limit=50".format(query)
     logging.info(url)
@@ -130,11 +131,11 @@ def scrape_wikinews(conn, project, articleset, query):
         logging.info("Adding {} articles to set {}:{}"
                      .format(len(arts), project, articleset))
         conn.create_articles(project=project, articleset=articleset,
-                            json_data=arts)
+                            json_data=arts, hash_cache=hash_cache)
 
 
 if __name__ == '__main__':
-    from amcatclient import AmcatAPI
+    from amcatclient import AmcatAPI, HashCache
     import argparse
 
     parser = argparse.ArgumentParser()
@@ -144,12 +145,22 @@ if __name__ == '__main__':
     parser.add_argument('query', help='Wikinews query for scraping')
     parser.add_argument('--username', help='Username for AmCAT login')
     parser.add_argument('--password', help='Password for AmCAT login')
+    parser.add_argument('--articleset', help='Add to this set rather than creating a new set')
+    parser.add_argument('--hash-cache', help='File with hashes of scraped articles, to skip '
+                        'articles that were scraped before')
     args = parser.parse_args()
 
     conn = AmcatAPI(args.host, args.username, args.password)
     category = "Iraq"
-    articleset = conn.create_set(project=args.project,
-                                 name="Wikinews articles for {}".format(args.query),
-                                 provenance="Scraped from wikinews on {}"
-                                 .format(datetime.datetime.now().isoformat()))
-    scrape_wikinews(conn, args.project, articleset['id'], args.query)
+    hash_cache = HashCache(args.hash_cache) if args.hash_cache else None
+    if hash_cache is not None and (hash_cache.target is not None or len(hash_cache)) and not args.articleset:
+        parser.error("Hash cache {} contains articles of an existing set ({}), use --articleset"
+                     .format(args.hash_cache, hash_cache.target))
+    if args.articleset:
+        articleset = args.articleset
+    else:
+        articleset = conn.create_set(project=args.project,
+                                     name="Wikinews articles for {}".format(args.query),
+                                     provenance="Scraped from wikinews on {}"
+                                     .format(datetime.datetime.now().isoformat()))['id']
+    scrape_wikinews(conn, args.project, articleset, args.query, hash_cache)
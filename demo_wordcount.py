@@ -23,10 +23,9 @@ Reads all articles from a set and counts the words in the article
 """
 
 import argparse
-import collections
-import re
 
 from amcatclient import AmcatAPI
+from amcatclient.analytics import count_words
 
 # Connect to AmCAT
 parser = argparse.ArgumentParser()
@@ -40,18 +39,10 @@ args = parser.parse_args()
 
 conn = AmcatAPI(args.host, args.username, args.password)
 
-# Iterate over the articles, count all words
-counts = collections.Counter()
-for a in conn.list_articles(args.project, args.articleset):
-    # get words by splitting lowercased text on non-word characters
-    text = a['text'].lower()
-    words = re.split("\W+", text)
-    counts.update(words)
-
-# delete all words with <= 3 characters
-for word in counts.keys():
-    if len(word) <= 3:
-        del counts[word]
+# Iterate over the articles and count all words (lowercased, split on
+# non-word characters) of more than 3 characters
+articles = conn.get_articles(args.project, args.articleset, columns=['text'])
+counts = count_words(articles, min_length=4)
 
 # print most common words
 for word, n in counts.most_common(n=20):
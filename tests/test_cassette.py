@@ -0,0 +1,38 @@
+import os
+import stat
+
+import requests
+
+from amcatclient.cassette import Cassette
+
+
+class FakeResponse(object):
+    def __init__(self, url, text):
+        self.url = url
+        self.status_code = 200
+        self.headers = {'Content-Type': 'application/json'}
+        self.text = text
+
+
+def test_record_and_replay(tmp_path, monkeypatch):
+    responses = iter(['{"status": "pending"}', '{"status": "done"}'])
+    monkeypatch.setattr(requests, "request", lambda method, url, **kargs: FakeResponse(url, next(responses)))
+    path = str(tmp_path / "cassette")
+
+    record = Cassette(path, mode="record")
+    assert record("get", "http://amcat/status").text == '{"status": "pending"}'
+    assert record("get", "http://amcat/status").text == '{"status": "done"}'
+
+    # repeated requests are replayed in order, repeating the last response
+    playback = Cassette(path)
+    assert [playback("get", "http://amcat/status").json()['status'] for _ in range(3)] == ["pending", "done", "done"]
+
+
+def test_owner_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(requests, "request", lambda method, url, **kargs: FakeResponse(url, '{"token": "secret"}'))
+    path = str(tmp_path / "cassette")
+    Cassette(path, mode="record")("post", "http://amcat/get_token", data={'password': 'x'})
+    for root, dirs, files in os.walk(path):
+        assert stat.S_IMODE(os.stat(root).st_mode) == 0o700
+        for fn in files:
+            assert stat.S_IMODE(os.stat(os.path.join(root, fn)).st_mode) == 0o600
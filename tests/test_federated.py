@@ -0,0 +1,44 @@
+import pytest
+
+from amcatclient.amcatclient import AmcatAPI
+from amcatclient.federated import FederatedAPI
+
+
+class FakeAPI(AmcatAPI):
+    def __init__(self, host, rows=()):
+        if host == "https://down.example.com":
+            raise IOError("Connection refused")
+        self.host = host
+        self.rows = rows
+
+    def aggregate(self, cancel=None, **filters):
+        return iter(self.rows)
+
+
+def federated(monkeypatch, apis):
+    monkeypatch.setattr(AmcatAPI, "__init__", FakeAPI.__init__)
+    return FederatedAPI(apis)
+
+
+def test_aggregate_combine(monkeypatch):
+    fed = federated(monkeypatch, [
+        FakeAPI("a", [{'year': 2019, 'medium': 1, 'count': 3}, {'year': 2020, 'medium': 1, 'count': 4}]),
+        FakeAPI("b", [{'year': 2019, 'medium': 1, 'count': 1}, {'year': 2019, 'medium': 2, 'count': 5}])])
+    assert sorted(fed.aggregate(), key=lambda r: r['host'])[0]['host'] == "a"
+    rows = fed.aggregate(combine=True)
+    assert sorted((r['year'], r['medium'], r['count']) for r in rows) == [(2019, 1, 4), (2019, 2, 5), (2020, 1, 4)]
+
+
+def test_connect_errors_kept(monkeypatch):
+    fed = federated(monkeypatch, [FakeAPI("a", [{'count': 1}]), "https://down.example.com"])
+    assert list(fed.apis) == ["a"]
+    fed.aggregate()
+    assert list(fed.connect_errors) == ["https://down.example.com"]
+    assert fed.errors == {}
+
+
+def test_host_key_collision(monkeypatch):
+    fed = federated(monkeypatch, [FakeAPI("a", [{'host': 'x', 'count': 1}])])
+    assert fed.aggregate() == []
+    assert isinstance(fed.errors["a"], ValueError)
+    assert fed.aggregate(host_key='server') == [{'host': 'x', 'count': 1, 'server': 'a'}]
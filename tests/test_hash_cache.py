@@ -0,0 +1,17 @@
+import pytest
+
+from amcatclient.amcatclient import HashCache
+
+
+def test_hash_cache_bound_to_set(tmp_path):
+    fn = str(tmp_path / "hashes")
+    cache = HashCache(fn)
+    cache.bind("https://amcat.nl", "1", 2)
+    cache.add([{'title': 'a', 'text': 'b'}])
+
+    cache = HashCache(fn)
+    assert cache.target == ["https://amcat.nl", 1, 2]
+    assert {'title': 'a', 'text': 'b'} in cache
+    cache.bind("https://amcat.nl", 1, 2)
+    with pytest.raises(ValueError):
+        cache.bind("https://amcat.nl", 1, 3)
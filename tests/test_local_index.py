@@ -0,0 +1,74 @@
+import pytest
+
+from amcatclient.local_index import LocalIndex, parse_query
+
+
+@pytest.mark.parametrize("query,expected", [
+    ('war', '"war"'),
+    ('war peace', '("war" OR "peace")'),
+    ('war AND peace', '("war" AND "peace")'),
+    ('war NOT peace', '("war" NOT "peace")'),
+    ('war AND NOT peace', '("war" NOT "peace")'),
+    ('war -peace', '("war" NOT "peace")'),
+    ('-peace war', '("war" NOT "peace")'),
+    ('war && peace || conflict', '(("war" AND "peace") OR "conflict")'),
+    ('"armed conflict" title:war*', '("armed conflict" OR title : "war" *)'),
+    ('(war OR conflict) AND NOT (peace OR truce)', '((("war" OR "conflict")) NOT (("peace" OR "truce")))'),
+])
+def test_parse(query, expected):
+    match, exclude, _ = parse_query(query)
+    assert match == expected
+    assert exclude is None
+
+
+@pytest.mark.parametrize("query", [
+    '', '+war', 'wa?', 'w*r', 'war~2', '"armed conflict"~2', 'war^2', '[a TO b]',
+    'NOT NOT war', '(NOT war)', 'war AND', '(war', 'date:2010',
+])
+def test_parse_unsupported(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+def test_parse_negated_only():
+    assert parse_query("NOT war") == (None, '"war"', [])
+    assert parse_query("-war -peace")[:2] == (None, '"war" OR "peace"')
+
+
+def test_hits_not_counted_for_negated_terms():
+    _, _, phrases = parse_query("war NOT peace")
+    assert [p.tokens for p in phrases] == [["war"]]
+
+
+@pytest.fixture
+def index():
+    index = LocalIndex()
+    index.add_articles([
+        {'id': 1, 'title': 'War news', 'text': 'the war in the east, armed conflict', 'date': '2020-01-01'},
+        {'id': 2, 'title': 'Peace', 'text': 'peace talks and no war'},
+        {'id': 3, 'title': 'Sports', 'text': 'football'},
+    ], articleset=7)
+    index.add_articles([{'id': 4, 'title': 'Other set', 'text': 'war'}], articleset=8)
+    yield index
+    index.close()
+
+
+def test_search(index):
+    assert list(index.search(7, 'war')) == [{'id': 1, 'hits': 2}, {'id': 2, 'hits': 1}]
+    assert list(index.search(7, 'war AND NOT peace', columns=['hits', 'date'])) == [
+        {'id': 1, 'hits': 2, 'date': '2020-01-01'}]
+    assert list(index.search(7, '"armed conflict"')) == [{'id': 1, 'hits': 1}]
+    assert list(index.search(7, 'title:war*')) == [{'id': 1, 'hits': 1}]
+    assert list(index.search([7, 8], 'war', columns=[])) == [{'id': 1}, {'id': 2}, {'id': 4}]
+
+
+def test_search_negated_only(index):
+    assert list(index.search(7, 'NOT war')) == [{'id': 3, 'hits': 0}]
+
+
+def test_hits_split_on_underscore(index):
+    # fts5 unicode61 treats _ as a separator, hit counting should do the same
+    index.add_articles([{'id': 5, 'title': '', 'text': 'foo bar'},
+                        {'id': 6, 'title': '', 'text': 'snake_case here'}], articleset=9)
+    assert list(index.search(9, 'foo_bar')) == [{'id': 5, 'hits': 1}]
+    assert list(index.search(9, 'snake')) == [{'id': 6, 'hits': 1}]
@@ -0,0 +1,93 @@
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from amcatclient.amcatclient import Cancelled
+from amcatclient.scraper import Scraper
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "scraper")
+
+
+class FixtureScraper(Scraper):
+    """Scrapes the saved pages in FIXTURES instead of the web"""
+
+    def get_urls(self):
+        return ["http://news.example.com/index.html"]
+
+    def fetch(self, url):
+        with open(os.path.join(FIXTURES, url.split("/")[-1])) as f:
+            return f.read()
+
+    def parse(self, url, html):
+        if url.endswith("index.html"):
+            for link in re.findall(r'<a href="([^"]+)"', html):
+                yield link
+            return
+        yield {'title': re.search("<title>(.*)</title>", html).group(1),
+               'date': re.search('<p class="date">(.*)</p>', html).group(1),
+               'text': re.search('<p class="text">(.*)</p>', html).group(1)}
+
+
+def test_scrape_fixtures():
+    articles = sorted(FixtureScraper().scrape(), key=lambda a: a['date'])
+    assert [a['title'] for a in articles] == ["Storm hits coast", "Coast cleans up"]
+    assert articles[0]['text'] == "A storm hit the coast on new year's day."
+
+
+class BusyDomainScraper(Scraper):
+    """The pages of slow.example.com only finish once fast.example.com has been fetched"""
+    fetch_threads = 2
+    max_per_domain = 1
+
+    def __init__(self):
+        self.fast_fetched = threading.Event()
+
+    def get_urls(self):
+        return ["http://slow.example.com/{}".format(i) for i in range(3)] + ["http://fast.example.com/"]
+
+    def fetch(self, url):
+        if "fast" in url:
+            self.fast_fetched.set()
+        elif not self.fast_fetched.wait(timeout=5):
+            raise AssertionError("fast.example.com was blocked by slow.example.com")
+        return url
+
+    def parse(self, url, html):
+        yield {'url': url}
+
+
+def test_busy_domain_does_not_block_other_domains():
+    scraper = BusyDomainScraper()
+    urls = {a['url'] for a in scraper.scrape()}
+    assert len(urls) == 4
+
+
+class HangingScraper(Scraper):
+    def __init__(self):
+        self.release = threading.Event()
+
+    def get_urls(self):
+        return ["http://hanging.example.com/"]
+
+    def fetch(self, url):
+        self.release.wait(timeout=30)
+        return ""
+
+    def parse(self, url, html):
+        return []
+
+
+def test_cancel_while_fetching():
+    scraper = HangingScraper()
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    start = time.time()
+    try:
+        with pytest.raises(Cancelled):
+            list(scraper.scrape(cancel=cancel))
+        assert time.time() - start < 5
+    finally:
+        scraper.release.set()
@@ -0,0 +1,26 @@
+from amcatclient.store import write_store
+
+
+def test_store(tmp_path):
+    store = write_store(str(tmp_path / "store"), [
+        {'id': 5, 'title': 'b', 'n': 3},
+        {'id': 2, 'title': 'a', 'text': ''},
+        {'id': 9, 'title': None},
+    ])
+    with store:
+        assert store.ids() == [2, 5, 9]
+        assert store.get(5, ['n']) == {'id': 5, 'n': 3}
+        assert store.get(2) == {'id': 2, 'title': 'a', 'text': ''}
+        assert store.get(9) == {'id': 9, 'title': None}
+        assert 3 not in store
+        pages = list(store.scroll(page_size=2, yield_pages=True, columns=['title']))
+        assert [[a['id'] for a in p['results']] for p in pages] == [[2, 5], [9]]
+        assert [p['next'] for p in pages] == [2, None]
+
+
+def test_store_flattens_properties(tmp_path):
+    # amcat 3.5 returns the article fields in a nested properties dict
+    article = {'id': 1, 'hash': 'abc', 'properties': {'title': 't', 'text': 'x', 'date': '2020-01-01'}}
+    with write_store(str(tmp_path / "store"), [article]) as store:
+        assert store.get(1, ['text']) == {'id': 1, 'text': 'x'}
+        assert 'properties' not in store.columns